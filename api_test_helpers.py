@@ -0,0 +1,70 @@
+"""
+Shared HTTP helpers for the backend API test scripts (backend_test.py, booking_conflict_test.py)
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import os
+import threading
+from pathlib import Path
+
+# One keep-alive connection pool for every call, so the TCP/TLS handshake is paid once.
+# No retries, so a deliberately provoked error is never silently re-sent
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=Retry(total=0, connect=0, read=0))
+
+# (connect, read) seconds; a hung server fails the call instead of stalling the whole run
+TIMEOUT = (2.0, 5.0)
+
+class TimeoutSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def make_session(token=None):
+    """Build a session on the shared connection pool, with the Authorization header preset for token"""
+    session = TimeoutSession()
+    session.headers.update({"Accept": "application/json"})
+    if token:
+        session.headers["Authorization"] = f"Bearer {token}"
+    session.mount("http://", _adapter)
+    session.mount("https://", _adapter)
+    return session
+
+SESSION = make_session()
+
+def post_json(url, obj, session=SESSION):
+    """POST a body encoded with orjson, which is several times faster than requests' stdlib json.
+    obj may also be JSON that is already encoded to bytes"""
+    body = obj if isinstance(obj, bytes) else orjson.dumps(obj)
+    return session.post(url, data=body, headers={"Content-Type": "application/json"})
+
+def parse_json(response):
+    return orjson.loads(response.content)
+
+# Tokens from earlier runs, keyed by backend URL and email, so a run can skip login and password hashing
+TOKEN_CACHE_PATH = Path(__file__).with_name(".test_token_cache.json")
+_token_cache_lock = threading.Lock()
+
+def _load_token_cache():
+    try:
+        return orjson.loads(TOKEN_CACHE_PATH.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+def cached_token(base_url, email):
+    return _load_token_cache().get(base_url, {}).get(email)
+
+def store_token(base_url, email, token):
+    """Record token for email, merging into the cache as it is on disk now so other entries survive"""
+    with _token_cache_lock:
+        token_cache = _load_token_cache()
+        token_cache.setdefault(base_url, {})[email] = token
+        # Write to a temp file and rename, so a concurrent reader never sees a partial file
+        tmp_path = TOKEN_CACHE_PATH.with_name(f"{TOKEN_CACHE_PATH.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(orjson.dumps(token_cache))
+            os.replace(tmp_path, TOKEN_CACHE_PATH)
+        except OSError:
+            pass
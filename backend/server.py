@@ -1,20 +1,36 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
+from pymongo.errors import PyMongoError
 import os
+import asyncio
 import logging
+import queue
+import copy
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import hashlib
+import time
 import base64
-import aiofiles
+import shutil
+from cachetools import TTLCache
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
@@ -22,11 +38,19 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 200)),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 32)),
+    serverSelectionTimeoutMS=3000
+)
 db = client[os.environ['DB_NAME']]
+# Booking inserts are acknowledged by the primary without waiting for the
+# journal flush; users and everything else keep the default write concern
+bookings_fast = db.get_collection("bookings", write_concern=WriteConcern(w=1, j=False))
 
-# Create the main app without a prefix
-app = FastAPI()
+# Create the main app without a prefix, serializing responses with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -34,11 +58,63 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
-JWT_ALGORITHM = 'HS256'
+# Optional Ed25519 private key (PEM). When set, tokens are signed with EdDSA
+# and can be verified by other services holding only the public key.
+JWT_PRIVATE_KEY = os.environ.get('JWT_PRIVATE_KEY')
+# Keys are prepared once instead of per encode/decode call
+if JWT_PRIVATE_KEY:
+    JWT_ALGORITHM = 'EdDSA'
+    JWT_SIGNING_KEY = load_pem_private_key(JWT_PRIVATE_KEY.encode('utf-8'), password=None)
+    if not isinstance(JWT_SIGNING_KEY, Ed25519PrivateKey):
+        raise RuntimeError("JWT_PRIVATE_KEY must be an Ed25519 private key")
+    JWT_VERIFYING_KEY = JWT_SIGNING_KEY.public_key()
+else:
+    JWT_ALGORITHM = 'HS256'
+    JWT_SIGNING_KEY = JWT_VERIFYING_KEY = JWT_SECRET.encode('utf-8')
+JWT_ALGORITHMS = [JWT_ALGORITHM]
+JWT_EXPIRATION = timedelta(days=7)
+
+# Auth caches: decoded JWT payloads keyed by token digest, users keyed by id
+AUTH_CACHE_TTL = 30
+token_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL)
+user_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_TTL)
+
+# In-process copy of GET /vehicles. Local writes and vehicle change stream
+# events drop it; the TTL bounds staleness where change streams are
+# unavailable (standalone mongod) and writes come from other processes.
+VEHICLE_CACHE_TTL = 60
+vehicle_cache = {"vehicles": None, "loaded_at": 0.0, "generation": 0}
+vehicle_cache_lock = asyncio.Lock()
+
+# Default capacity for vehicles created before the capacity field existed
+DEFAULT_VEHICLE_CAPACITY = {
+    'motorcycle': 2,
+    'car': 5,
+    'truck': 3,
+    'van': 8
+}
+
+# Password hashing is CPU-bound, keep it off the event loop
+password_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password")
+# New hashes use argon2id; bcrypt is only kept to verify legacy "$2b$" hashes
+password_hasher = PasswordHasher(time_cost=3, memory_cost=64 * 1024, parallelism=2)
+
+# Compound index backing the booking conflict query
+BOOKING_CONFLICT_INDEX = "vehicle_status_dates"
 
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Accepted image formats: (magic bytes, canonical extension)
+IMAGE_HEADER_SIZE = 16
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
 
 # Mount static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -67,9 +143,21 @@ class PaymentStatus(str, Enum):
     FAILED = "failed"
     REFUNDED = "refunded"
 
+# IDs are UUIDv7: the millisecond timestamp prefix keeps inserts into the
+# id indexes close to append-only instead of scattered like uuid4
+def new_id() -> str:
+    timestamp_ms = time.time_ns() // 1_000_000
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | (0x7 << 76)  # version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 9562 variant
+    return str(uuid.UUID(int=value))
+
 # Models
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    # Instances are shared across requests through user_cache
+    model_config = ConfigDict(frozen=True)
+
+    id: str = Field(default_factory=new_id)
     email: str
     name: str
     phone: str
@@ -88,7 +176,7 @@ class UserLogin(BaseModel):
     password: str
 
 class Vehicle(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str
     type: VehicleType
     brand: str
@@ -112,7 +200,7 @@ class VehicleCreate(BaseModel):
     description: str
 
 class Booking(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     user_id: str
     vehicle_id: str
     start_date: datetime
@@ -145,41 +233,151 @@ class BookingWithDetails(BaseModel):
     created_at: datetime
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def check_password_hash(password: str, hashed: str) -> bool:
+    if hashed.startswith('$2'):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed: str) -> bool:
+    return hashed.startswith('$2') or password_hasher.check_needs_rehash(hashed)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, password_hasher.hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, check_password_hash, password, hashed)
 
 def create_jwt_token(user_id: str, role: str) -> str:
     payload = {
         'user_id': user_id,
         'role': role,
-        'exp': datetime.now(timezone.utc) + timedelta(days=7)
+        'exp': datetime.now(timezone.utc) + JWT_EXPIRATION
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, JWT_SIGNING_KEY, algorithm=JWT_ALGORITHM)
+
+def credential_cache_key(credential: str) -> bytes:
+    # Any in-memory table keyed by a credential stores this 16-byte SHA-256
+    # prefix instead of the credential itself
+    return hashlib.sha256(credential.encode('utf-8')).digest()[:16]
 
 def decode_jwt_token(token: str):
+    cache_key = credential_cache_key(token)
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        if payload['exp'] > time.time():
+            return payload
+        token_cache.pop(cache_key, None)
+        raise HTTPException(status_code=401, detail="Token expired")
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        payload = jwt.decode(token, JWT_VERIFYING_KEY, algorithms=JWT_ALGORITHMS)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache[cache_key] = payload
+    return payload
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     payload = decode_jwt_token(credentials.credentials)
-    user = await db.users.find_one({"id": payload["user_id"]})
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    user = user_cache.get(payload["user_id"])
+    if user is None:
+        user_doc = await db.users.find_one({"id": payload["user_id"]})
+        if not user_doc:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = User(**user_doc)
+        user_cache[user.id] = user
+    return user
 
 async def get_admin_user(current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+def facet_count(facet: list) -> int:
+    # $count emits no document at all when nothing matched
+    return facet[0]["count"] if facet else 0
+
+def detect_image_extension(header: bytes) -> Optional[str]:
+    for magic, extension in IMAGE_SIGNATURES:
+        if header.startswith(magic):
+            return extension
+    # WebP is a RIFF container: "RIFF" <4-byte size> "WEBP"
+    if header.startswith(b'RIFF') and header.startswith(b'WEBP', 8):
+        return 'webp'
+    return None
+
+def save_upload(source, destination: Path) -> None:
+    # Copies in fixed-size chunks so memory stays bounded by the chunk size
+    with open(destination, 'wb') as f:
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+
+async def migrate_vehicle_capacity(vehicles: List[dict]) -> None:
+    # Handle migration for vehicles without capacity field
+    for vehicle in vehicles:
+        if 'capacity' not in vehicle:
+            # Set default capacity based on vehicle type
+            default_capacity = DEFAULT_VEHICLE_CAPACITY.get(vehicle.get('type', 'car'), 5)
+            vehicle['capacity'] = default_capacity
+            # Update in database
+            await db.vehicles.update_one(
+                {"id": vehicle["id"]},
+                {"$set": {"capacity": default_capacity}}
+            )
+
+def invalidate_vehicle_cache() -> None:
+    vehicle_cache["vehicles"] = None
+    vehicle_cache["generation"] += 1
+
+def cached_vehicles() -> Optional[List[dict]]:
+    if time.monotonic() - vehicle_cache["loaded_at"] < VEHICLE_CACHE_TTL:
+        return vehicle_cache["vehicles"]
+    return None
+
+async def get_available_vehicles() -> List[dict]:
+    vehicles = cached_vehicles()
+    if vehicles is not None:
+        return vehicles
+    async with vehicle_cache_lock:
+        # Another request may have reloaded the cache while we waited
+        vehicles = cached_vehicles()
+        if vehicles is not None:
+            return vehicles
+        generation = vehicle_cache["generation"]
+        vehicles = await db.vehicles.find({"available": True}, {"_id": 0}).to_list(length=None)
+        await migrate_vehicle_capacity(vehicles)
+        # Don't publish a result that a concurrent write has already made stale
+        if generation == vehicle_cache["generation"]:
+            vehicle_cache["vehicles"] = vehicles
+            vehicle_cache["loaded_at"] = time.monotonic()
+        return vehicles
+
+async def watch_vehicle_changes() -> None:
+    try:
+        async with db.vehicles.watch() as stream:
+            async for _ in stream:
+                invalidate_vehicle_cache()
+    except PyMongoError as e:
+        logger.warning("Vehicle change stream stopped, cache falls back to TTL: %s", e)
+
+async def find_conflicting_booking(vehicle_id: str, start: datetime, end: datetime):
+    # Flat range predicates plus a projection of indexed fields only, so the
+    # planner runs a covered IXSCAN on the compound index
+    return await db.bookings.find_one(
+        {
+            "vehicle_id": vehicle_id,
+            "status": {"$in": ["confirmed", "active"]},
+            "start_date": {"$lte": end},
+            "end_date": {"$gte": start}
+        },
+        {"_id": 0, "vehicle_id": 1},
+        hint=BOOKING_CONFLICT_INDEX
+    )
+
 def calculate_days(start_date: datetime, end_date: datetime) -> int:
     delta = end_date.date() - start_date.date()
     return max(1, delta.days)
@@ -193,17 +391,15 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     
     # Create user
-    user_dict = user_data.dict()
-    del user_dict['password']
-    user = User(**user_dict)
+    user = User(**user_data.model_dump(exclude={'password'}))
     
-    # Store in database
-    user_doc = user.dict()
-    user_doc['password'] = hashed_password
-    await db.users.insert_one(user_doc)
+    # Store in database; insert_one adds _id to the dict it is given, so the
+    # stored document is a copy and user_doc is reused for the response
+    user_doc = user.model_dump()
+    await db.users.insert_one({**user_doc, 'password': hashed_password})
     
     # Create JWT token
     token = create_jwt_token(user.id, user.role.value)
@@ -211,16 +407,23 @@ async def register(user_data: UserCreate):
     return {
         "message": "User registered successfully",
         "token": token,
-        "user": user.dict()
+        "user": user_doc
     }
 
 @api_router.post("/auth/login", response_model=dict)
 async def login(login_data: UserLogin):
     # Find user
     user_doc = await db.users.find_one({"email": login_data.email})
-    if not user_doc or not verify_password(login_data.password, user_doc['password']):
+    if not user_doc or not await verify_password(login_data.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Upgrade legacy bcrypt hashes on successful login
+    if password_needs_rehash(user_doc['password']):
+        await db.users.update_one(
+            {"id": user_doc['id']},
+            {"$set": {"password": await hash_password(login_data.password)}}
+        )
+    
     # Create JWT token
     token = create_jwt_token(user_doc['id'], user_doc['role'])
     
@@ -231,7 +434,7 @@ async def login(login_data: UserLogin):
     return {
         "message": "Login successful",
         "token": token,
-        "user": user.dict()
+        "user": user.model_dump()
     }
 
 @api_router.get("/auth/me", response_model=User)
@@ -241,52 +444,32 @@ async def get_me(current_user: User = Depends(get_current_user)):
 # Vehicle routes
 @api_router.get("/vehicles", response_model=List[Vehicle])
 async def get_vehicles():
-    vehicles = await db.vehicles.find({"available": True}).to_list(length=None)
-    # Handle migration for vehicles without capacity field
-    for vehicle in vehicles:
-        if 'capacity' not in vehicle:
-            # Set default capacity based on vehicle type
-            default_capacity = {
-                'motorcycle': 2,
-                'car': 5,
-                'truck': 3,
-                'van': 8
-            }.get(vehicle.get('type', 'car'), 5)
-            vehicle['capacity'] = default_capacity
-            # Update in database
-            await db.vehicles.update_one(
-                {"id": vehicle["id"]},
-                {"$set": {"capacity": default_capacity}}
-            )
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    # response_model validates and serializes the documents in a single pass
+    return await get_available_vehicles()
 
 @api_router.get("/vehicles/all", response_model=List[Vehicle])
 async def get_all_vehicles(current_user: User = Depends(get_admin_user)):
-    vehicles = await db.vehicles.find().to_list(length=None)
-    # Handle migration for vehicles without capacity field
-    for vehicle in vehicles:
-        if 'capacity' not in vehicle:
-            # Set default capacity based on vehicle type
-            default_capacity = {
-                'motorcycle': 2,
-                'car': 5,
-                'truck': 3,
-                'van': 8
-            }.get(vehicle.get('type', 'car'), 5)
-            vehicle['capacity'] = default_capacity
-            # Update in database
-            await db.vehicles.update_one(
-                {"id": vehicle["id"]},
-                {"$set": {"capacity": default_capacity}}
-            )
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    vehicles = await db.vehicles.find({}, {"_id": 0}).to_list(length=None)
+    await migrate_vehicle_capacity(vehicles)
+    # response_model validates and serializes the documents in a single pass
+    return vehicles
 
 @api_router.post("/vehicles", response_model=Vehicle)
 async def create_vehicle(vehicle_data: VehicleCreate, current_user: User = Depends(get_admin_user)):
-    vehicle = Vehicle(**vehicle_data.dict())
-    await db.vehicles.insert_one(vehicle.dict())
+    vehicle = Vehicle(**vehicle_data.model_dump())
+    await db.vehicles.insert_one(vehicle.model_dump())
+    invalidate_vehicle_cache()
     return vehicle
 
+@api_router.post("/vehicles/bulk", response_model=List[Vehicle])
+async def create_vehicles_bulk(vehicles_data: List[VehicleCreate], current_user: User = Depends(get_admin_user)):
+    # One auth check and one insert_many for the whole batch
+    vehicles = [Vehicle(**vehicle_data.model_dump()) for vehicle_data in vehicles_data]
+    if vehicles:
+        await db.vehicles.insert_many([vehicle.model_dump() for vehicle in vehicles])
+        invalidate_vehicle_cache()
+    return vehicles
+
 @api_router.post("/vehicles/{vehicle_id}/upload-image")
 async def upload_vehicle_image(vehicle_id: str, file: UploadFile = File(...), current_user: User = Depends(get_admin_user)):
     # Check if vehicle exists
@@ -294,19 +477,19 @@ async def upload_vehicle_image(vehicle_id: str, file: UploadFile = File(...), cu
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    # Validate file type
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    # Validate file type from its magic bytes, not the client-supplied metadata
+    header = await file.read(IMAGE_HEADER_SIZE)
+    await file.seek(0)
+    file_extension = detect_image_extension(header)
+    if file_extension is None:
+        raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, GIF or WebP image")
     
     # Generate unique filename
-    file_extension = file.filename.split('.')[-1]
     filename = f"{vehicle_id}_{uuid.uuid4()}.{file_extension}"
     file_path = UPLOAD_DIR / filename
     
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Save file with a single worker-thread hop for the whole copy
+    await run_in_threadpool(save_upload, file.file, file_path)
     
     # Update vehicle with image URL
     image_url = f"/uploads/{filename}"
@@ -314,6 +497,7 @@ async def upload_vehicle_image(vehicle_id: str, file: UploadFile = File(...), cu
         {"id": vehicle_id},
         {"$set": {"image_url": image_url}}
     )
+    invalidate_vehicle_cache()
     
     return {"message": "Image uploaded successfully", "image_url": image_url}
 
@@ -322,6 +506,7 @@ async def delete_vehicle(vehicle_id: str, current_user: User = Depends(get_admin
     result = await db.vehicles.delete_one({"id": vehicle_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    invalidate_vehicle_cache()
     return {"message": "Vehicle deleted successfully"}
 
 # Booking routes
@@ -333,13 +518,9 @@ async def create_booking(booking_data: BookingCreate, current_user: User = Depen
         raise HTTPException(status_code=404, detail="Vehicle not found or not available")
     
     # Check for conflicting bookings
-    existing_booking = await db.bookings.find_one({
-        "vehicle_id": booking_data.vehicle_id,
-        "status": {"$in": ["confirmed", "active"]},
-        "$or": [
-            {"start_date": {"$lte": booking_data.end_date}, "end_date": {"$gte": booking_data.start_date}}
-        ]
-    })
+    existing_booking = await find_conflicting_booking(
+        booking_data.vehicle_id, booking_data.start_date, booking_data.end_date
+    )
     
     if existing_booking:
         raise HTTPException(status_code=400, detail="Vehicle is not available for selected dates")
@@ -358,88 +539,66 @@ async def create_booking(booking_data: BookingCreate, current_user: User = Depen
         total_amount=total_amount
     )
     
-    await db.bookings.insert_one(booking.dict())
+    await bookings_fast.insert_one(booking.model_dump())
     return booking
 
+# Aggregate stages to join a booking with the user and vehicle fields it shows.
+# The joined documents are projected inside the $lookup so only those fields
+# are fetched, each via a point lookup on the users.id / vehicles.id indexes.
+BOOKING_DETAILS_STAGES = [
+    {"$lookup": {
+        "from": "users",
+        "let": {"user_id": "$user_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$id", "$$user_id"]}}},
+            {"$project": {"_id": 0, "name": 1, "email": 1}}
+        ],
+        "as": "user"
+    }},
+    {"$lookup": {
+        "from": "vehicles",
+        "let": {"vehicle_id": "$vehicle_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$id", "$$vehicle_id"]}}},
+            {"$project": {"_id": 0, "name": 1, "type": 1}}
+        ],
+        "as": "vehicle"
+    }},
+    {"$unwind": "$user"},
+    {"$unwind": "$vehicle"},
+    {"$project": {
+        "_id": 0,
+        "id": 1,
+        "user_id": 1,
+        "user_name": "$user.name",
+        "user_email": "$user.email",
+        "vehicle_id": 1,
+        "vehicle_name": "$vehicle.name",
+        "vehicle_type": "$vehicle.type",
+        "start_date": 1,
+        "end_date": 1,
+        "total_days": 1,
+        "total_amount": 1,
+        "status": 1,
+        "payment_status": 1,
+        "created_at": 1
+    }}
+]
+
 @api_router.get("/bookings", response_model=List[BookingWithDetails])
 async def get_user_bookings(current_user: User = Depends(get_current_user)):
-    # Aggregate pipeline to join booking with user and vehicle data
-    pipeline = [
-        {"$match": {"user_id": current_user.id}},
-        {"$lookup": {
-            "from": "users",
-            "localField": "user_id",
-            "foreignField": "id",
-            "as": "user"
-        }},
-        {"$lookup": {
-            "from": "vehicles",
-            "localField": "vehicle_id",
-            "foreignField": "id",
-            "as": "vehicle"
-        }},
-        {"$unwind": "$user"},
-        {"$unwind": "$vehicle"},
-        {"$project": {
-            "id": 1,
-            "user_id": 1,
-            "user_name": "$user.name",
-            "user_email": "$user.email",
-            "vehicle_id": 1,
-            "vehicle_name": "$vehicle.name",
-            "vehicle_type": "$vehicle.type",
-            "start_date": 1,
-            "end_date": 1,
-            "total_days": 1,
-            "total_amount": 1,
-            "status": 1,
-            "payment_status": 1,
-            "created_at": 1
-        }}
-    ]
+    pipeline = [{"$match": {"user_id": current_user.id}}] + BOOKING_DETAILS_STAGES
     
     bookings = await db.bookings.aggregate(pipeline).to_list(length=None)
-    return [BookingWithDetails(**booking) for booking in bookings]
+    return bookings
 
 @api_router.get("/bookings/all", response_model=List[BookingWithDetails])
 async def get_all_bookings(current_user: User = Depends(get_admin_user)):
-    # Aggregate pipeline to join booking with user and vehicle data
-    pipeline = [
-        {"$lookup": {
-            "from": "users",
-            "localField": "user_id",
-            "foreignField": "id",
-            "as": "user"
-        }},
-        {"$lookup": {
-            "from": "vehicles",
-            "localField": "vehicle_id",
-            "foreignField": "id",
-            "as": "vehicle"
-        }},
-        {"$unwind": "$user"},
-        {"$unwind": "$vehicle"},
-        {"$project": {
-            "id": 1,
-            "user_id": 1,
-            "user_name": "$user.name",
-            "user_email": "$user.email",
-            "vehicle_id": 1,
-            "vehicle_name": "$vehicle.name",
-            "vehicle_type": "$vehicle.type",
-            "start_date": 1,
-            "end_date": 1,
-            "total_days": 1,
-            "total_amount": 1,
-            "status": 1,
-            "payment_status": 1,
-            "created_at": 1
-        }},
-        {"$sort": {"created_at": -1}}
-    ]
+    # Sort before joining so the sort can use the created_at index
+    pipeline = [{"$sort": {"created_at": -1}}] + BOOKING_DETAILS_STAGES
     
     bookings = await db.bookings.aggregate(pipeline).to_list(length=None)
-    return [BookingWithDetails(**booking) for booking in bookings]
+    return bookings
 
 @api_router.put("/bookings/{booking_id}/status")
 async def update_booking_status(
@@ -465,28 +624,40 @@ async def update_booking_status(
 # Dashboard routes
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(current_user: User = Depends(get_admin_user)):
-    # Get counts
-    total_vehicles = await db.vehicles.count_documents({})
-    available_vehicles = await db.vehicles.count_documents({"available": True})
-    total_bookings = await db.bookings.count_documents({})
-    active_bookings = await db.bookings.count_documents({"status": "active"})
-    total_customers = await db.users.count_documents({"role": "customer"})
-    
-    # Get revenue (from completed bookings)
-    revenue_pipeline = [
-        {"$match": {"payment_status": "paid"}},
-        {"$group": {"_id": None, "total_revenue": {"$sum": "$total_amount"}}}
+    # One round-trip per collection, run concurrently
+    vehicles_pipeline = [
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "available": [{"$match": {"available": True}}, {"$count": "count"}]
+        }}
     ]
-    revenue_result = await db.bookings.aggregate(revenue_pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
+    # Revenue comes from paid bookings
+    bookings_pipeline = [
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "active": [{"$match": {"status": "active"}}, {"$count": "count"}],
+            "revenue": [
+                {"$match": {"payment_status": "paid"}},
+                {"$group": {"_id": None, "total_revenue": {"$sum": "$total_amount"}}}
+            ]
+        }}
+    ]
+    vehicle_stats, booking_stats, total_customers = await asyncio.gather(
+        db.vehicles.aggregate(vehicles_pipeline).to_list(1),
+        db.bookings.aggregate(bookings_pipeline).to_list(1),
+        db.users.count_documents({"role": "customer"})
+    )
+    vehicle_stats = vehicle_stats[0]
+    booking_stats = booking_stats[0]
+    revenue = booking_stats["revenue"]
     
     return {
-        "total_vehicles": total_vehicles,
-        "available_vehicles": available_vehicles,
-        "total_bookings": total_bookings,
-        "active_bookings": active_bookings,
+        "total_vehicles": facet_count(vehicle_stats["total"]),
+        "available_vehicles": facet_count(vehicle_stats["available"]),
+        "total_bookings": facet_count(booking_stats["total"]),
+        "active_bookings": facet_count(booking_stats["active"]),
         "total_customers": total_customers,
-        "total_revenue": total_revenue
+        "total_revenue": revenue[0]["total_revenue"] if revenue else 0
     }
 
 # Vehicle availability check
@@ -502,13 +673,7 @@ async def check_vehicle_availability(vehicle_id: str, start_date: str, end_date:
         raise HTTPException(status_code=400, detail="Invalid date format")
     
     # Check for conflicting bookings
-    conflicting_booking = await db.bookings.find_one({
-        "vehicle_id": vehicle_id,
-        "status": {"$in": ["confirmed", "active"]},
-        "$or": [
-            {"start_date": {"$lte": end}, "end_date": {"$gte": start}}
-        ]
-    })
+    conflicting_booking = await find_conflicting_booking(vehicle_id, start, end)
     
     return {"available": conflicting_booking is None}
 
@@ -523,13 +688,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+class DeferredFormatQueueHandler(QueueHandler):
+    # The stock prepare() formats the record on the logging thread, and the
+    # listener's handler then formats it a second time. Only merge msg % args
+    # here (unless the listener's formatter needs the raw args) and leave the
+    # line layout to the listener.
+    def __init__(self, log_queue, merge_args=True):
+        super().__init__(log_queue)
+        self.merge_args = merge_args
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if self.merge_args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+# Configure logging. Handlers only enqueue records; a listener thread does
+# the formatting and the stream writes, off the request path.
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+# Access lines keep the handlers uvicorn configured (AccessFormatter on stdout),
+# now run by the listener. AccessFormatter unpacks record.args, so they stay raw.
+# With no handlers attached (--no-access-log, or a --log-config that lets access
+# lines propagate to root) the logger is left exactly as uvicorn set it up.
+access_logger = logging.getLogger("uvicorn.access")
+access_handlers = list(access_logger.handlers)
+if access_handlers:
+    log_handler.addFilter(lambda record: record.name != "uvicorn.access")
+    for handler in access_handlers:
+        handler.addFilter(lambda record: record.name == "uvicorn.access")
+
+log_listener = QueueListener(log_queue, log_handler, *access_handlers, respect_handler_level=True)
+log_listener.start()
+
+root_logger = logging.getLogger()
+for handler in root_logger.handlers[:]:
+    root_logger.removeHandler(handler)
+    handler.close()
+root_logger.addHandler(DeferredFormatQueueHandler(log_queue))
+root_logger.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-request access logs go through the same queue, or off with ACCESS_LOG=false
+if access_handlers:
+    access_logger.handlers = [DeferredFormatQueueHandler(log_queue, merge_args=False)]
+    access_logger.propagate = False
+access_logger.disabled = os.environ.get('ACCESS_LOG', 'true').lower() == 'false'
+
+@app.on_event("startup")
+async def warm_db_connection():
+    # Fail fast on a bad MONGO_URL and let minPoolSize fill in the background
+    await db.command("ping")
+
+@app.on_event("startup")
+async def create_indexes():
+    await db.users.create_index("email", unique=True)
+    await db.users.create_index("id", unique=True)
+    await db.vehicles.create_index("id", unique=True)
+    await db.vehicles.create_index([("available", 1)])
+    await db.bookings.create_index("id", unique=True)
+    await db.bookings.create_index([("user_id", 1)])
+    await db.bookings.create_index([("created_at", -1)])
+    # Covers the conflict query in create_booking and check_vehicle_availability
+    await db.bookings.create_index(
+        [("vehicle_id", 1), ("status", 1), ("start_date", 1), ("end_date", 1)],
+        name=BOOKING_CONFLICT_INDEX
+    )
+
+@app.on_event("startup")
+async def start_vehicle_watcher():
+    app.state.vehicle_watcher = asyncio.create_task(watch_vehicle_changes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    app.state.vehicle_watcher.cancel()
+    client.close()
+    password_executor.shutdown(wait=False)
+    log_listener.stop()
\ No newline at end of file
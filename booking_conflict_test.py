@@ -3,33 +3,74 @@
 Specific test for booking conflict detection logic
 """
 
-import requests
-import json
 import os
+import sys
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from api_test_helpers import make_session, post_json, parse_json, cached_token, store_token
 
 load_dotenv('/app/frontend/.env')
 REACT_APP_BACKEND_URL = os.getenv('REACT_APP_BACKEND_URL')
 BASE_URL = f"{REACT_APP_BACKEND_URL}/api"
 
+# fromisoformat accepts a trailing 'Z' from Python 3.11 on; older versions need it rewritten
+if sys.version_info >= (3, 11):
+    ISO_PARSE = datetime.fromisoformat
+else:
+    def ISO_PARSE(value):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def login(credentials):
+    """Return a session for credentials, reusing the cached token while the backend still accepts it"""
+    token = cached_token(BASE_URL, credentials["email"])
+    if token:
+        session = make_session(token)
+        if session.get(f"{BASE_URL}/auth/me").status_code == 200:
+            return session
+    
+    response = post_json(f"{BASE_URL}/auth/login", credentials)
+    token = parse_json(response)['token']
+    store_token(BASE_URL, credentials["email"], token)
+    return make_session(token)
+
 def test_booking_conflict_logic():
     """Test the booking conflict detection in detail"""
     print("🔍 Testing Booking Conflict Detection Logic")
     
-    # First, let's get the existing bookings to understand the current state
     admin_data = {
         "email": "sarah.admin@rentalcorp.com",
         "password": "SecureAdmin2024!"
     }
+    customer_data = {
+        "email": "mike.customer@email.com",
+        "password": "CustomerPass123!"
+    }
     
-    admin_response = requests.post(f"{BASE_URL}/auth/login", json=admin_data)
-    admin_token = admin_response.json()['token']
-    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    # The customer login doesn't depend on the admin steps, so it runs in the background
+    # while the admin lists and confirms the booking
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        customer_future = executor.submit(login, customer_data)
+        try:
+            success = check_booking_conflict(admin_data, customer_future)
+        finally:
+            customer_future.cancel()
+        
+        # Paths that never needed the customer session still report a failed login
+        if not customer_future.cancelled() and customer_future.exception() is not None:
+            print(f"❌ Customer login failed: {customer_future.exception()}")
+            success = False
+    
+    return success
+
+def check_booking_conflict(admin_data, customer_future):
+    """Confirm an existing booking as admin, then expect an overlapping customer booking to be rejected"""
+    # First, let's get the existing bookings to understand the current state
+    admin_session = login(admin_data)
     
     # Get all bookings to see current state
-    bookings_response = requests.get(f"{BASE_URL}/bookings/all", headers=admin_headers)
-    bookings = bookings_response.json()
+    bookings_response = admin_session.get(f"{BASE_URL}/bookings/all")
+    bookings = parse_json(bookings_response)
     
     print(f"Current bookings in system: {len(bookings)}")
     for booking in bookings:
@@ -41,27 +82,19 @@ def test_booking_conflict_logic():
         first_booking = bookings[0]
         print(f"\n📝 Updating booking {first_booking['id'][:8]}... to 'confirmed' status")
         
-        update_response = requests.put(
-            f"{BASE_URL}/bookings/{first_booking['id']}/status?status=confirmed", 
-            headers=admin_headers
+        update_response = admin_session.put(
+            f"{BASE_URL}/bookings/{first_booking['id']}/status?status=confirmed"
         )
         
         if update_response.status_code == 200:
             print("✅ Successfully updated booking to confirmed status")
             
-            # Now try to create a conflicting booking
-            customer_data = {
-                "email": "mike.customer@email.com",
-                "password": "CustomerPass123!"
-            }
-            
-            customer_response = requests.post(f"{BASE_URL}/auth/login", json=customer_data)
-            customer_token = customer_response.json()['token']
-            customer_headers = {"Authorization": f"Bearer {customer_token}"}
+            # Now try to create a conflicting booking; it must follow the confirmation
+            customer_session = customer_future.result()
             
             # Create overlapping booking
-            start_date = datetime.fromisoformat(first_booking['start_date'].replace('Z', '+00:00'))
-            end_date = datetime.fromisoformat(first_booking['end_date'].replace('Z', '+00:00'))
+            start_date = ISO_PARSE(first_booking['start_date'])
+            end_date = ISO_PARSE(first_booking['end_date'])
             
             overlapping_booking = {
                 "vehicle_id": first_booking['vehicle_id'],
@@ -70,7 +103,7 @@ def test_booking_conflict_logic():
             }
             
             print(f"🔄 Attempting to create overlapping booking for same vehicle...")
-            conflict_response = requests.post(f"{BASE_URL}/bookings", json=overlapping_booking, headers=customer_headers)
+            conflict_response = post_json(f"{BASE_URL}/bookings", overlapping_booking, customer_session)
             
             if conflict_response.status_code == 400:
                 print("✅ Booking conflict correctly detected and rejected")
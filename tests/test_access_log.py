@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# uvicorn configures logging before it imports the app, so each case runs in a
+# fresh interpreter in that order and emits one access record the way uvicorn does
+ACCESS_LOG_SCRIPT = textwrap.dedent("""
+    import logging, sys
+    from uvicorn.config import Config
+
+    Config(app="server:app", access_log={access_log})
+    sys.path.insert(0, {backend_dir!r})
+    import server
+
+    access_logger = logging.getLogger("uvicorn.access")
+    print("has_handlers", access_logger.hasHandlers())
+    access_logger.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:5000", "GET", "/api/vehicles", "1.1", 200)
+    server.log_listener.stop()
+""")
+
+
+def run_access_log(access_log, **env):
+    script = ACCESS_LOG_SCRIPT.format(access_log=access_log, backend_dir=str(BACKEND_DIR))
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "access_log_test", **env},
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout + result.stderr
+
+
+def test_no_access_log_emits_no_access_lines():
+    output = run_access_log(False)
+    assert "has_handlers False" in output
+    assert "/api/vehicles" not in output
+
+
+def test_access_log_line_is_formatted_once_by_uvicorn():
+    output = run_access_log(True)
+    lines = [line for line in output.splitlines() if "/api/vehicles" in line]
+    assert lines == ['INFO:     127.0.0.1:5000 - "GET /api/vehicles HTTP/1.1" 200 OK']
+
+
+def test_access_log_env_switch_disables_access_lines():
+    output = run_access_log(True, ACCESS_LOG="false")
+    assert "/api/vehicles" not in output